@@ -0,0 +1,66 @@
+"""Throughput benchmark of the build output of 'nola build'.
+
+A child process prints 100k lines like a verbose make. They are printed by build.run_process(), to the console and to a log file (--log),
+and by printing every line as the older implementation did for comparison.
+
+    python3 benchmarks/build_output.py [--lines N]
+"""
+import argparse
+import locale
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+
+from nola_tools import build
+
+CHILD = """
+import sys
+out = sys.stdout.buffer
+for i in range({lines}):
+    if i % 1000 == 0:
+        out.write(b"src/main.c:%d: warning: unused variable 'x'\\n" % i)
+    else:
+        out.write("arm-none-eabi-gcc -c -Os src/모듈_%d.c -o obj/모듈_%d.o\\n".encode('utf-8') % (i, i))
+"""
+
+def run_per_line(command):
+    # The way of printing before batching: decode and print every line.
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    for line in iter(process.stdout.readline, b''):
+        print(line.decode(locale.getpreferredencoding()).rstrip())
+    process.stderr.read()
+    return process.wait()
+
+def measure(name, func, lines):
+    stdout = sys.stdout
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        sys.stdout = devnull
+        try:
+            time_start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - time_start
+        finally:
+            sys.stdout = stdout
+    print(f"* {name:<12} {elapsed:8.3f} s  {lines / elapsed:12.0f} lines/s")
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput benchmark of the build output')
+    parser.add_argument('--lines', type=int, default=100000, help='The number of lines printed')
+    args = parser.parse_args()
+
+    command = [sys.executable, '-c', CHILD.format(lines=args.lines)]
+
+    measure('per line', lambda: run_per_line(command), args.lines)
+    measure('console', lambda: build.run_process(command, os.environ), args.lines)
+    with tempfile.TemporaryDirectory() as d:
+        with open(os.path.join(d, 'build.log'), 'wb', buffering=0) as log_file:
+            measure('log file', lambda: build.run_process(command, os.environ, log_file=log_file), args.lines)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
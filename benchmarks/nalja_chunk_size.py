@@ -0,0 +1,101 @@
+"""Benchmark of the chunk sizes of 'nalja' under the payload limit of a network.
+
+An image is sent chunk by chunk to a simulated network which rejects the downlinks over the limit as 'Oversized Payload'. The rejections
+and the downlinks are counted for the size model of nalja, and for shrinking the chunk by a byte per rejection as the older implementation
+did. With --band, the device reports the data rates --dr and the largest one of the band by turns every --period uplinks, and the limit is
+also bounded by the maximum payload of the data rate.
+
+    python3 benchmarks/nalja_chunk_size.py [--size BYTES] [--limit BYTES] [--band BAND --dr DR [--period N]] [--grow-after N]
+"""
+import argparse
+import contextlib
+import os
+import sys
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+
+from nola_tools import nalja
+
+KEY = 'benchmark:device'
+
+def get_limit(args, uplinks):
+    """Return the maximum payload of the network and the data rate reported by the device, if any."""
+    if args.band is None:
+        return args.limit, None
+    payloads = nalja.MAX_PAYLOAD[args.band]
+    dr = args.dr if (uplinks // args.period) % 2 == 0 else max(payloads)
+    return min(args.limit, payloads[dr]), dr
+
+def send(args, chunk_size, oversized, accepted, report):
+    """Send the image and return the number of rejections and of downlinks."""
+    offset = 0
+    rejections = 0
+    downlinks = 0
+    while offset < args.size:
+        limit, dr = get_limit(args, downlinks - rejections)
+        if dr is not None:
+            report(dr)
+        size = min(chunk_size(), args.size - offset)
+        downlinks += 1
+        if size + nalja.SEND_HEADER_SIZE > limit:
+            rejections += 1
+            if not oversized(size):
+                break
+        else:
+            accepted(size)
+            offset += size
+    return rejections, downlinks
+
+def run_size_model(args):
+    nalja.state[KEY] = {
+        'chunk_size': args.chunksize,
+        'learned_size': args.chunksize,
+        'size_ceiling': nalja.MAX_CHUNK_SIZE,
+        'size_model': nalja.new_size_model(),
+        'band': None,
+        'dr': None,
+        'device_class': None,
+        'window': 1,
+        'transferring': False,
+        'position': 0
+    }
+    return send(args,
+                lambda: nalja.state[KEY]['chunk_size'],
+                lambda size: nalja.size_oversized(KEY, size),
+                lambda size: nalja.size_accepted(KEY, size),
+                lambda dr: nalja.update_lorawan(KEY, {'band': args.band, 'dr': dr}))
+
+def run_one_byte(args):
+    # The way of sizing before the size model: shrink the chunk by a byte per rejection.
+    chunk_size = [args.chunksize]
+    def oversized(size):
+        chunk_size[0] = size - 1
+        return chunk_size[0] > 0
+    return send(args, lambda: chunk_size[0], oversized, lambda size: None, lambda dr: None)
+
+def measure(name, func, args):
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            rejections, downlinks = func(args)
+    print(f"* {name:<12} {rejections:6} rejections  {downlinks:6} downlinks")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the chunk sizes of nalja')
+    parser.add_argument('--size', type=int, default=65536, help='The size of the image')
+    parser.add_argument('--limit', type=int, default=121, help='The maximum payload of the network')
+    parser.add_argument('--chunksize', type=int, default=nalja.MAX_CHUNK_SIZE, help='The chunk size to begin with')
+    parser.add_argument('--band', choices=nalja.MAX_PAYLOAD.keys(), help='The LoRaWAN band of the data rates reported by the device')
+    parser.add_argument('--dr', type=int, default=0, help='The data rate reported by turns with the largest one of the band')
+    parser.add_argument('--period', type=int, default=50, help='The number of uplinks between the data rate reports')
+    parser.add_argument('--grow-after', type=int, default=nalja.GROW_AFTER, help='The number of accepted chunks before larger sizes are probed')
+    args = parser.parse_args()
+
+    nalja.image_size = args.size
+    nalja.GROW_AFTER = args.grow_after
+    measure('one byte', run_one_byte, args)
+    measure('size model', run_size_model, args)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
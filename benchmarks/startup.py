@@ -0,0 +1,66 @@
+"""Startup benchmark of the 'nola' command line interface.
+
+Trivial commands must not import the modules only needed for building or managing the SDK repository.
+
+    python3 benchmarks/startup.py [--runs N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Commands which must start without importing the heavy modules below.
+TRIVIAL_COMMANDS = ['path', 'devmode', 'jobs']
+
+HEAVY_MODULES = ['git', 'pbr', 'nola_tools.build', 'nola_tools.repo']
+
+RUN_NOLA = "import sys; sys.argv = ['nola'] + sys.argv[1:]; import nola_tools; sys.exit(nola_tools.main())"
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run(args, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', RUN_NOLA] + args
+    env = dict(os.environ)
+    env['PYTHONPATH'] = root_dir + os.pathsep + env.get('PYTHONPATH', '')
+    return subprocess.run(command, capture_output=True, env=env)
+
+def get_imported_modules(args):
+    """Return {module: cumulative import time in us} parsed from '-X importtime'."""
+    modules = {}
+    for line in run(args, importtime=True).stderr.decode(errors='replace').splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            modules[fields[2].strip()] = int(fields[1])
+        except (IndexError, ValueError):
+            continue
+    return modules
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup benchmark of the nola command line interface')
+    parser.add_argument('--runs', type=int, default=20, help='The number of runs per command')
+    args = parser.parse_args()
+
+    failed = False
+    for command in TRIVIAL_COMMANDS:
+        time_start = time.perf_counter()
+        for _ in range(args.runs):
+            run([command])
+        elapsed = (time.perf_counter() - time_start) / args.runs
+
+        modules = get_imported_modules([command])
+        heavy = [m for m in modules if m.split('.')[0] in HEAVY_MODULES or m in HEAVY_MODULES]
+        print(f"* nola {command}: {elapsed * 1000:.1f} ms, {len(modules)} modules imported")
+        if len(heavy) > 0:
+            print(f"  Unexpected imports: {heavy}", file=sys.stderr)
+            failed = True
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
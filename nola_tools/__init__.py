@@ -8,20 +8,16 @@ except ImportError:
 import argparse
 import sys
 import os
-import json
-import shutil
-import git
-import platform
 
+# Modules for the commands (build, repo, git, ...) are imported by the commands needing them to start fast.
 from .utils import config_file
-from .build import build, clean, supported_boards
-from .repo import clone, get_versions, get_current_version, checkout, update
 
 home_dir = os.path.join(os.path.expanduser('~'), '.nola')
 os.makedirs(home_dir, exist_ok=True)
 
 config_json = os.path.join(home_dir, 'config.json')
 repo_dir = os.path.join(home_dir, 'repo')
+sdk_dir = os.path.join(home_dir, 'sdk')
 key_file = os.path.join(home_dir, 'key')
 
 # TODO Clone the public library.
@@ -35,7 +31,26 @@ def set_key(token):
         f.write("\n-----END OPENSSH PRIVATE KEY-----\n")
     os.chmod(key_file, 0o400)
 
+def get_clone_options(config):
+    options = {
+        'depth': config.get('clone_depth'),
+        'filter': config.get('clone_filter')
+    }
+    if config.get('sparse_checkout') == True:
+        project = config_file.load('Nol.A-project.json')
+        options['sparse_boards'] = [project['board']] if 'board' in project else []
+    return options
+
+def clone_public_repo(config):
+    if config.get('user') is None and os.path.exists(repo_dir) == False:
+        from .repo import clone
+        print("* Cloning common library...")
+        clone(repo_dir, None, **get_clone_options(config))
+
 def info():
+    from .repo import get_versions
+    from .board_index import get_boards
+
     print(f"* Nol.A-SDK Command Line Interface v{__version__}")
 
     config = config_file.load(config_json)
@@ -53,29 +68,40 @@ def info():
     print(f"* Current version: {current_version}")
     print(f"* Avilable versions: {versions}")
 
-    boards = list(supported_boards(repo_dir))
-    print(f"* Avilable boards: {boards}", file=sys.stderr)
+    boards = get_boards(repo_dir)
+    print(f"* Avilable boards: {list(boards)}", file=sys.stderr)
+    for name, board in boards.items():
+        if board['mcu'] is not None or board['flash_size'] is not None or len(board['interfaces']) > 0:
+            print(f"  {name}: MCU {board['mcu']}, flash {board['flash_size']}, interfaces {board['interfaces']}", file=sys.stderr)
 
     if 'libnola' in config:
         print(f"* libnola under development: {config['libnola']}")
     return 0
 
 def login(user, token):
+    from .repo import clone, checkout
+
     config = config_file.load(config_json)
-    config['user'] = user
     set_key(token)
 
-    if clone(repo_dir, user):
-        config_file.save(config, config_json)
+    if clone(repo_dir, user, **get_clone_options(config)):
+        with config_file.lock(config_json):
+            config = config_file.load(config_json)
+            config['user'] = user
+            config_file.save(config, config_json)
         return checkout(repo_dir)
     else:
         return False
 
 def logout():
-    config = config_file.load(config_json)
-    if 'user' in config.keys():
-        del config['user']
-    config_file.save(config, config_json)
+    import shutil
+    from .repo import remove_tree
+
+    with config_file.lock(config_json):
+        config = config_file.load(config_json)
+        if 'user' in config.keys():
+            del config['user']
+        config_file.save(config, config_json)
 
     if os.path.isfile(key_file):
         os.remove(key_file)
@@ -83,10 +109,14 @@ def logout():
         shutil.rmtree(key_file)
 
     if os.path.isdir(repo_dir):
-        shutil.rmtree(repo_dir)
+        remove_tree(repo_dir)
     elif os.path.isfile(repo_dir):
         os.remove(repo_dir)
 
+    # The worktrees of the SDK versions belong to the repository removed.
+    if os.path.isdir(sdk_dir):
+        remove_tree(sdk_dir)
+
     # TODO Clone the public library.
     
     return True
@@ -102,60 +132,93 @@ def get_path(key=None):
             print(paths.get(key))
 
 def set_path(key, path):
-    config = config_file.load(config_json)
-    paths = config.get('path')
-    if type(paths) is not dict:
-        paths = {}
-    if path == "":
-        if key in paths.keys():
-            del paths[key]
-    else:
-        paths[key] = path
-    config['path'] = paths
-    config_file.save(config, config_json)
+    with config_file.lock(config_json):
+        config = config_file.load(config_json)
+        paths = config.get('path')
+        if type(paths) is not dict:
+            paths = {}
+        if path == "":
+            if key in paths.keys():
+                del paths[key]
+        else:
+            paths[key] = path
+        config['path'] = paths
+        config_file.save(config, config_json)
 
 def devmode(path_to_libnola=None):
-    config = config_file.load(config_json)
-    if path_to_libnola is None:
+    with config_file.lock(config_json):
+        config = config_file.load(config_json)
+        if path_to_libnola is None:
+            return config.get('libnola')
+        elif path_to_libnola == '':
+            if 'libnola' in config.keys():
+                del config['libnola']
+        else:
+            config['libnola'] = os.path.expanduser(path_to_libnola)
+        config_file.save(config, config_json)
         return config.get('libnola')
-    elif path_to_libnola == '':
-        if 'libnola' in config.keys():
-            del config['libnola']
-    else:
-        config['libnola'] = os.path.expanduser(path_to_libnola)
-    config_file.save(config, config_json)
-    return config.get('libnola')
     
-def main():
-    config = config_file.load(config_json)
-    if config.get('user') is None and os.path.exists(repo_dir) == False:
-        print("* Cloning common library...")
-        clone(repo_dir, None)
+def set_jobs(jobs=None):
+    with config_file.lock(config_json):
+        config = config_file.load(config_json)
+        if jobs is None:
+            return config.get('jobs')
+        elif jobs == '':
+            if 'jobs' in config.keys():
+                del config['jobs']
+        else:
+            config['jobs'] = jobs if jobs == 'auto' else int(jobs)
+        config_file.save(config, config_json)
+        return config.get('jobs')
 
+def main():
     parser = argparse.ArgumentParser(description=f"Nol.A-SDK Command Line Interface version {__version__}")
-    parser.add_argument('command', nargs='?', help='info\nbuild[={board}], checkout[={version}], login={user}:{token}, logout, update, path={key}:{value}, devmode={path to libnola source tree}')
+    parser.add_argument('command', nargs='?', help='info\nbuild[={board}[,{board}...]|all], checkout[={version}], login={user}:{token}, logout, update, path={key}:{value}, devmode={path to libnola source tree}, jobs={number of jobs or auto}, cache[=clear], serve[={number of concurrent builds}]')
+    parser.add_argument('--force', action='store_true', help='Rebuild libnola in the development mode even if it is not changed')
+    parser.add_argument('--profile', action='store_true', help='Print the time spent in each phase of the build')
+    parser.add_argument('--log', help='Write the build output to the file, and print only warnings and errors', metavar='file')
     args = parser.parse_args()
 
     if args.command is None:
         print("* A command must be specified.", file=sys.stderr)
         parser.print_help()
         return 1
-    elif args.command == "info":
+
+    if args.command.split('=')[0] in ['build', 'flash']:
+        # A running daemon builds faster with everything loaded already.
+        from .server import request
+        ret_code = request(sys.argv[1:])
+        if ret_code is not None:
+            return ret_code
+
+    if args.command.split('=')[0] in ['info', 'build', 'flash', 'checkout', 'update', 'doc']:
+        clone_public_repo(config_file.load(config_json))
+
+    if args.command.startswith('build') or args.command.startswith('flash') or args.command == 'clean':
+        from .build import build, clean
+    elif args.command.startswith('checkout') or args.command == 'update':
+        from .repo import checkout, update
+    elif args.command.startswith('cache'):
+        from . import cache
+    elif args.command.startswith('serve'):
+        from .server import serve
+
+    if args.command == "info":
         return info()
     elif args.command.startswith("build"):
         if len(args.command) < 6:
-            return 0 if build(config_file.load(config_json)) else 1
+            return 0 if build(config_file.load(config_json), force=args.force, show_profile=args.profile, log_path=args.log) else 1
         elif args.command[5] == "=":
-            return 0 if build(config_file.load(config_json), args.command[6:]) else 1
+            return 0 if build(config_file.load(config_json), args.command[6:], force=args.force, show_profile=args.profile, log_path=args.log) else 1
         else:
             print("* Use 'build=[board name]' to change the board", file=sys.stderr)
             parser.print_help()
             return 1
     elif args.command.startswith("flash"):
         if args.command == "flash":
-            return 0 if build(config_file.load(config_json), board=None, interface='LAST') else 1
+            return 0 if build(config_file.load(config_json), board=None, interface='LAST', force=args.force, show_profile=args.profile, log_path=args.log) else 1
         elif args.command[5] == "=":
-            return 0 if build(config_file.load(config_json), board=None, interface=args.command[6:]) else 1
+            return 0 if build(config_file.load(config_json), board=None, interface=args.command[6:], force=args.force, show_profile=args.profile, log_path=args.log) else 1
         else:
             print("* Use 'flash=[interface name]' to flash the board new image", file=sys.stderr)
             parse.print_help()
@@ -226,6 +289,8 @@ def main():
             return 1
 
     elif args.command == "doc":
+        import platform
+
         if platform.system() == 'Darwin':
             open_cmd = 'open'
         elif platform.system() == 'Linux':
@@ -270,6 +335,42 @@ def main():
         else:
             print_devmode_help()
             return 1
+
+    elif args.command.startswith('jobs'):
+        def print_jobs_help():
+            print("* 'jobs' shows the number of parallel make jobs.", file=sys.stderr)
+            print("* 'jobs={number}' set the number of parallel make jobs.", file=sys.stderr)
+            print("* 'jobs=auto' sizes the jobs from the CPU count and the load average.", file=sys.stderr)
+            print("* 'jobs=' removes the setting.", file=sys.stderr)
+
+        if args.command == 'jobs':
+            jobs = set_jobs(None)
+            if jobs is not None:
+                print(jobs)
+            return 0
+        elif len(args.command) > 4 and args.command[4] == "=":
+            new_jobs = args.command[5:]
+            if new_jobs == 'auto' or new_jobs == '' or new_jobs.isdigit():
+                print(set_jobs(new_jobs))
+                return 0
+            else:
+                print_jobs_help()
+                return 1
+        else:
+            print_jobs_help()
+            return 1
+
+    elif args.command == 'serve':
+        return 0 if serve() else 1
+    elif args.command.startswith('serve='):
+        if not args.command[6:].isdigit() or int(args.command[6:]) < 1:
+            print("* Use 'serve={number}' to set the number of commands served at a time", file=sys.stderr)
+            return 1
+        return 0 if serve(int(args.command[6:])) else 1
+    elif args.command == 'cache':
+        return 0 if cache.report() else 1
+    elif args.command == 'cache=clear':
+        return 0 if cache.clear() else 1
     else:
         print("* Unknown command", file=sys.stderr)
         parser.print_help()
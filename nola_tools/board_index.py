@@ -0,0 +1,57 @@
+import os
+import re
+from .repo import get_cached, SPARSE_COMMON_DIRS
+
+# 'NAME = value', 'NAME := value', 'NAME ?= value', 'NAME += value' and 'export NAME = value' of the board makefiles.
+MAKE_VARIABLE_PATTERN = re.compile(r'^\s*(?:export\s+)?([A-Za-z_][A-Za-z0-9_]*)\s*([:?+]?)=\s*(.*?)\s*$')
+
+def is_board_dir(repo_dir, name):
+    return not name.startswith('.') and name not in SPARSE_COMMON_DIRS and os.path.isdir(os.path.join(repo_dir, name))
+
+def parse_make_variables(path):
+    variables = {}
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                m = MAKE_VARIABLE_PATTERN.match(line.split('#', 1)[0])
+                if m is None:
+                    continue
+                name, op, value = m.groups()
+                if op == '+' and name in variables:
+                    variables[name] += ' ' + value
+                elif op != '?' or name not in variables:
+                    variables[name] = value
+    except OSError:
+        pass
+    return variables
+
+def get_board_metadata(board_dir):
+    """Read the metadata of a board from the variables of its makefiles, and list its prebuilt files."""
+    variables = {}
+    blobs = []
+    for f in sorted(os.listdir(board_dir)):
+        if f == 'Makefile' or f.endswith('.mk'):
+            variables.update(parse_make_variables(os.path.join(board_dir, f)))
+        elif f.endswith('.bin') or f.endswith('.hex'):
+            blobs.append(f)
+
+    return {
+        'mcu': variables.get('MCU', variables.get('CPU')),
+        'flash_size': variables.get('FLASH_SIZE'),
+        'interfaces': variables.get('FLASH_INTERFACES', '').split(),
+        'blobs': blobs
+    }
+
+def scan(repo_dir):
+    return {d: get_board_metadata(os.path.join(repo_dir, d)) for d in sorted(os.listdir(repo_dir)) if is_board_dir(repo_dir, d)}
+
+def get_boards(repo_dir):
+    """Return {board: metadata} of the SDK.
+
+    It is indexed once per SDK version (i.e., until the refs or the checkout of the repository change), and the SDK tree is not scanned again.
+    A tree which is not a git repository (e.g., libnola under development) is scanned every time."""
+    return get_cached(repo_dir, 'boards', lambda: scan(repo_dir))
+
+def get_board(repo_dir, board):
+    """Return the metadata of the board, or None if it is not supported."""
+    return get_boards(repo_dir).get(board)
@@ -1,73 +1,235 @@
 import sys
 import os
-import json
 import shutil
 import glob
 import subprocess
 import platform
 import time
 import locale
+import selectors
+import codecs
+import re
+import contextlib
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
 from pbr.version import VersionInfo
-from queue import Queue, Empty
+from queue import Queue
 from threading import Thread
-from .repo import get_current_version
+from concurrent.futures import ThreadPoolExecutor
+from .repo import get_current_version, get_tree_fingerprint, add_sparse_board, get_worktree, remove_tree
 from .utils import config_file
+from . import cache
+from . import compiler_cache
+from . import build_profile
+from . import board_index
 
 ON_POSIX = 'posix' in sys.builtin_module_names
 
 def supported_boards(repo_dir):
-    for d in os.listdir(repo_dir):
-        if os.path.isdir(os.path.join(repo_dir, d)) and d not in ['include', 'make', 'tools', '.git']:
-            yield d
+    return list(board_index.get_boards(repo_dir))
+
+def read_chunks(process):
+    """Yield (pipe, data) from the stdout and stderr of `process` in arrival order until both are closed.
+
+    An empty data is yielded once when each pipe is closed."""
+    if ON_POSIX:
+        sel = selectors.DefaultSelector()
+        for out in (process.stdout, process.stderr):
+            sel.register(out, selectors.EVENT_READ)
+
+        num_open = 2
+        while num_open > 0:
+            for key, _ in sel.select():
+                out = key.fileobj
+                data = os.read(out.fileno(), 65536)
+                if not data:
+                    sel.unregister(out)
+                    out.close()
+                    num_open -= 1
+                yield out, data
+        sel.close()
+    else:
+        # Windows cannot select() on pipes. Let a reader thread per pipe feed a single queue.
+        def enqueue(out, queue):
+            for data in iter(lambda: out.read1(65536), b''):
+                queue.put((out, data))
+            out.close()
+            queue.put((out, b''))
+
+        q = Queue()
+        for out in (process.stdout, process.stderr):
+            Thread(target=enqueue, args=(out, q), daemon=True).start()
+
+        num_open = 2
+        while num_open > 0:
+            out, data = q.get()
+            if not data:
+                num_open -= 1
+            yield out, data
+
+def get_jobs(project, config):
+    jobs = project.get('jobs', config.get('jobs'))
+    if jobs is None:
+        return None, None
+
+    cpus = os.cpu_count() or 1
+    if str(jobs).lower() == 'auto':
+        try:
+            load = os.getloadavg()[0]
+        except (AttributeError, OSError):
+            load = 0
+        # Leave the cores that are already busy to others, and let make hold off spawning while the host is loaded.
+        return max(1, cpus - int(load)), cpus
+
+    try:
+        jobs = int(jobs)
+    except ValueError:
+        print(f"* Invalid jobs '{jobs}' is ignored. Use a number or 'auto'.", file=sys.stderr)
+        return None, None
+    return max(1, jobs), None
+
+def get_make_parallel_args(jobs, load_limit):
+    if jobs is None:
+        return []
+
+    args = [f"-j{jobs}"]
+    if load_limit is not None:
+        args.append(f"-l{load_limit}")
+    if jobs > 1 and make_supports_output_sync():
+        args.append('--output-sync=line')
+    return args
+
+def make_supports_output_sync():
+    # '--output-sync' has been supported since GNU make 4.0. macOS still ships 3.81.
+    try:
+        v = subprocess.run(['make', '--version'], capture_output=True).stdout.decode(errors='replace')
+    except OSError:
+        return False
+    words = v.split()
+    try:
+        major = int(words[words.index('Make') + 1].split('.')[0])
+    except (ValueError, IndexError):
+        return False
+    return major >= 4
 
-def run_process(command, env):
+def log(message, prefix=None, file=None):
+    log_lines([message], prefix, file)
+
+def log_lines(lines, prefix=None, file=None):
+    # A single write per batch keeps the lines of concurrent board builds from being mixed up, and the terminal from slowing the build.
+    if len(lines) == 0:
+        return
+    if prefix is not None:
+        text = ''.join(f"[{prefix}] {line}\n" for line in lines)
+    else:
+        text = '\n'.join(lines) + '\n'
+    (sys.stdout if file is None else file).write(text)
+
+DIAGNOSTIC_PATTERN = re.compile(r'\b(error|warning)\b|undefined reference|\*\*\*', re.IGNORECASE)
+# Literals matched on the lowercase text are much faster to scan for than DIAGNOSTIC_PATTERN.
+DIAGNOSTIC_CANDIDATE = re.compile(r'error|warning|undefined reference|\*\*\*')
+
+def get_diagnostics(lines):
+    """Return the warning and error lines among `lines`."""
+    # A single scan over the whole batch, and only the candidate lines are matched exactly.
+    text = '\n'.join(lines).lower()
+    diagnostics = []
+    index = 0
+    pos = 0
+    for m in DIAGNOSTIC_CANDIDATE.finditer(text):
+        if m.start() < pos:
+            continue
+        index += text.count('\n', pos, m.start())
+        pos = text.find('\n', m.end())
+        if pos < 0:
+            pos = len(text)
+        if DIAGNOSTIC_PATTERN.search(lines[index]) is not None:
+            diagnostics.append(lines[index])
+    return diagnostics
+
+def run_process(command, env, prefix=None, profile=None, log_file=None):
+    """Run the command printing its output.
+
+    If `log_file` (opened in binary mode) is given, the output is written to it as it is, and only warnings and errors are printed with a progress line."""
+    time_start = time.perf_counter()
     process = subprocess.Popen(command,
                                stdout=subprocess.PIPE,
                                stderr=subprocess.PIPE,
                                env=env,
                                close_fds=ON_POSIX)
 
-    def enqueue(out, queue):
-        for line in iter(out.readline, b''):
-            queue.put(line)
-        out.close()
-
-    q_out = Queue()
-    t_out = Thread(target=enqueue, args=(process.stdout, q_out))
-    t_out.daemon = True
-    t_out.start()
-        
-    q_err = Queue()
-    t_err = Thread(target=enqueue, args=(process.stderr, q_err))
-    t_err.daemon = True
-    t_err.start()
-        
-    while True:
-        try:
-            line = q_out.get_nowait()
-            if line:
-                try:
-                    print(line.decode(locale.getpreferredencoding()).rstrip())
-                except UnicodeDecodeError:
-                    print(line)
-        except Empty:
-            pass
-
-        try:
-            line = q_err.get_nowait()
-            if line:
-                try:
-                    print(line.decode(locale.getpreferredencoding()).rstrip())
-                except UnicodeDecodeError:
-                    print(line)
-        except Empty:
-            pass
-
-        ret_code = process.poll()
-        if ret_code is not None:
-            return ret_code
-
-def build(config, board=None, interface=None):
+    encoding = locale.getpreferredencoding()
+    decoders = {}
+    pending = {}
+    num_lines = 0
+    show_progress = log_file is not None and prefix is None and sys.stdout.isatty()
+    progress_time = 0
+    progress_len = 0
+
+    for out, data in read_chunks(process):
+        if log_file is not None:
+            log_file.write(data)
+
+        if out not in decoders:
+            # Multibyte characters split over reads are decoded incrementally.
+            decoders[out] = codecs.getincrementaldecoder(encoding)(errors='replace')
+            pending[out] = ''
+        lines = (pending[out] + decoders[out].decode(data, final=(data == b''))).split('\n')
+        pending[out] = lines.pop()
+        if data == b'' and pending[out] != '':
+            lines.append(pending[out])
+        lines = [line.rstrip() for line in lines]
+
+        for line in lines:
+            build_profile.add_line(profile, line)
+        num_lines += len(lines)
+
+        if log_file is not None:
+            lines = get_diagnostics(lines)
+        if show_progress and len(lines) > 0:
+            # Overwrite the progress line.
+            lines[0] = '\r' + lines[0].ljust(progress_len)
+            progress_time = 0
+        log_lines(lines, prefix)
+
+        if show_progress and time.perf_counter() - progress_time > 0.2:
+            progress = f"* {num_lines} lines logged to {log_file.name}"
+            sys.stdout.write('\r' + progress.ljust(progress_len))
+            sys.stdout.flush()
+            progress_len = len(progress)
+            progress_time = time.perf_counter()
+
+    if show_progress:
+        sys.stdout.write(f"\r* {num_lines} lines logged to {log_file.name}".ljust(progress_len) + '\n')
+
+    if profile is not None and hasattr(os, 'wait4'):
+        # The resource usage of the child, including its children waited (e.g., compilers run by make).
+        _, status, ru = os.wait4(process.pid, 0)
+        process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    else:
+        process.wait()
+        ru = None
+    build_profile.add_process(profile, command, time.perf_counter() - time_start, ru)
+    return process.returncode
+
+def run_make(command, env, project, config, board, prefix=None, profile=None, log_file=None):
+    env = dict(env)
+    use_ccache = compiler_cache.is_enabled(project, config) and compiler_cache.setup_env(env, board)
+    if use_ccache:
+        compiler_cache.zero_stats(env)
+
+    ret_code = run_process(command, env, prefix, profile, log_file)
+
+    if use_ccache:
+        stats = compiler_cache.get_stats(env)
+        if stats is not None:
+            log(f"* Compiler cache: {stats[0]} hits, {stats[1]} misses", prefix)
+    return ret_code
+
+def build(config, board=None, interface=None, force=False, show_profile=False, log_path=None):
     if os.path.exists('Nol.A-project.json') == False:
         print("* The Nol.A project file is not found.", file=sys.stderr)
         print("* If you want to start a new project, use 'new' command.", file=sys.stderr)
@@ -75,9 +237,23 @@ def build(config, board=None, interface=None):
 
     project = config_file.load("Nol.A-project.json")
 
+    if board is not None and (board == 'all' or ',' in board):
+        return build_matrix(config, project, board, force, show_profile, log_path)
+
     if board is not None:
         project['board'] = board
 
+    with contextlib.ExitStack() as stack:
+        # Unbuffered, so that nothing is lost even if the process exits without closing it (e.g., a daemon child).
+        log_file = stack.enter_context(open(log_path, 'wb', buffering=0)) if log_path is not None else None
+        return build_project(config, project, interface, force, show_profile, log_file)
+
+def build_project(config, project, interface, force, show_profile, log_file):
+    profile = build_profile.new(project['board'])
+
+    jobs, load_limit = get_jobs(project, config)
+    make_parallel_args = get_make_parallel_args(jobs, load_limit)
+
     if 'libnola' in config:
         if config['libnola'].startswith('wsl://'):
             sep = config['libnola'][6:].find('/')
@@ -97,67 +273,118 @@ def build(config, board=None, interface=None):
             print(cwd_wsl)
             
             command = ['wsl', '-d', dist, '--cd', cwd_wsl, 'python3', '-u', '-m', 'nola_tools.__init__', 'build']
-        else:
-            command = ['make', '-C', config['libnola'], f"TARGET={project['board']}", "SKIP_BUILD_TEST=1"]
-
-        ret_code = run_process(command, os.environ)
- 
-        if config['libnola'].startswith('wsl://'):
-            return ret_code
-        
-        if ret_code != 0:
-            print(f"* Building libnola failed ({ret_code})", file=sys.stderr)
-            return False
-        
-        repo_dir = os.path.join(config['libnola'], 'nola-sdk')
+            return run_process(command, os.environ)
+
+        with build_profile.phase(profile, 'libnola'):
+            libnola_fingerprint = get_tree_fingerprint(config['libnola'])
+            libnola_changed = force or is_libnola_changed(config, project['board'], libnola_fingerprint)
+            if libnola_changed:
+                if build_libnola(config, project, project['board'], make_parallel_args, profile=profile, log_file=log_file) == False:
+                    return False
+            else:
+                print("* libnola is not changed since the last build. Use '--force' to rebuild it.")
     else:
-        repo_dir = os.path.join(os.path.expanduser('~'), '.nola', 'repo')
+        libnola_fingerprint = None
+        libnola_changed = False
+
+    repo_dir = get_repo_dir(config, project)
+    if repo_dir is None:
+        return False
+
+    boards = supported_boards(repo_dir)
+    if project['board'] not in boards and 'libnola' not in config and add_sparse_board(repo_dir, project['board']):
+        boards = supported_boards(repo_dir)
 
-    if project['board'] not in supported_boards(repo_dir):
+    if project['board'] not in boards:
         print(f"* The board '{project['board']}' not supported.", file=sys.stderr)
-        boards = list(supported_boards(repo_dir))
         print(f"* Avilable boards: {boards}", file=sys.stderr)
         return False
 
     print(f"* Target board: {project['board']}")
-    with open("Nol.A-project.json", 'w', encoding='utf-8') as f:
-        json.dump(project, f, indent=4)
+    config_file.save(project, "Nol.A-project.json", indent=4)
+
+    with build_profile.phase(profile, 'versions'):
+        project_version, libnola_version = get_build_versions(config, repo_dir)
+
+    if jobs is not None:
+        print(f"* Parallel jobs: {jobs}{f' (load limit: {load_limit})' if load_limit is not None else ''}")
 
+    return build_board(config, project, project['board'], repo_dir,
+                       project_version, libnola_version,
+                       make_parallel_args, interface,
+                       libnola_fingerprint=libnola_fingerprint,
+                       clean=libnola_changed,
+                       profile=profile,
+                       show_profile=show_profile,
+                       log_file=log_file) == 0
+
+def get_repo_dir(config, project={}):
+    if 'libnola' in config:
+        return os.path.join(config['libnola'], 'nola-sdk')
+
+    repo_dir = os.path.join(os.path.expanduser('~'), '.nola', 'repo')
+    if 'sdk' in project:
+        # The project pins its SDK version to a worktree shared with other projects.
+        worktree = get_worktree(repo_dir, project['sdk'])
+        if worktree is None:
+            print(f"* The SDK version '{project['sdk']}' is not found.", file=sys.stderr)
+        return worktree
+    return repo_dir
+
+def is_libnola_changed(config, board, fingerprint):
+    if fingerprint is None:
+        return True
+    if not os.path.isdir(os.path.join(get_repo_dir(config), board)):
+        return True
+    last_build_context = config_file.load(os.path.join('build', board, 'build.json'))
+    return last_build_context.get('libnola') != fingerprint
+
+def build_libnola(config, project, board, make_parallel_args, prefix=None, profile=None, log_file=None):
+    command = ['make', '-C', config['libnola'], f"TARGET={board}", "SKIP_BUILD_TEST=1"] + make_parallel_args
+    ret_code = run_make(command, os.environ, project, config, board, prefix, profile, log_file)
+    if ret_code != 0:
+        log(f"* Building libnola failed ({ret_code})", prefix, sys.stderr)
+        return False
+    return True
+
+def get_build_versions(config, repo_dir):
     project_version = get_current_version('.')
     if project_version is None:
         print(f"* Project version: unknown")
     else:
         print(f"* Project version: {project_version['describe']}")
     
-    libnola_version = get_current_version(repo_dir)
+    # The SDK repository is changed only by nola, but the libnola source tree can be changed anytime in development mode.
+    libnola_version = get_current_version(repo_dir, use_cache='libnola' not in config)
     print(f"* libnola version: {libnola_version['describe']}{' (dev)' if 'libnola' in config else ''}")
+    return project_version, libnola_version
 
-    build_dir = os.path.join('build', project['board'])
-    if 'libnola' in config and os.path.exists(build_dir):
-        # If in development mode, always clean before make.
-        shutil.rmtree(build_dir)
+def build_board(config, project, board, repo_dir, project_version, libnola_version, make_parallel_args, interface=None, prefix=None, libnola_fingerprint=None, clean=False, profile=None, show_profile=False, log_file=None):
+    build_dir = os.path.join('build', board)
+    if clean and os.path.exists(build_dir):
+        # libnola has been rebuilt in development mode. The compiler cache keeps it cheap.
+        remove_tree(build_dir)
 
     last_build_context = config_file.load(os.path.join(build_dir, 'build.json'))
 
     if 'ver' in last_build_context:
-        print(f"* Last used library version: {last_build_context['ver']}")
+        log(f"* Last used library version: {last_build_context['ver']}", prefix)
         if last_build_context['ver'] != libnola_version and os.path.exists(build_dir):
-            shutil.rmtree(build_dir)
+            remove_tree(build_dir)
 
     os.makedirs(build_dir, exist_ok=True)
 
-    for srcfile in glob.glob(os.path.join(repo_dir, project['board'], '*.bin')):
-        shutil.copy(srcfile, build_dir)
-
-    for srcfile in glob.glob(os.path.join(repo_dir, project['board'], '*.hex')):
-        shutil.copy(srcfile, build_dir)
+    with build_profile.phase(profile, 'staging'):
+        num_staged, size_avoided = stage_blobs(repo_dir, board, build_dir)
+    if num_staged > 0:
+        log(f"* Staged {num_staged} board file(s) ({size_avoided} bytes not copied)", prefix)
 
     command_args = ['make', '--no-print-directory',
                     '-C', build_dir,
-                    '-f', os.path.join(repo_dir, 'make', 'Makefile')]
+                    '-f', os.path.join(repo_dir, 'make', 'Makefile')] + make_parallel_args
 
     if 'options' in project:
-        print(f"* Project options: {project['options']}")
+        log(f"* Project options: {project['options']}", prefix)
         command_args += project['options'].split(' ')
 
     if 'def' in project:
@@ -173,9 +400,9 @@ def build(config, board=None, interface=None):
                         'PROJ_VER_PATCH',
                         'PROJ_VER_COMMIT',
                         'PROJ_VER_DIRTY']:
-                print(f"* User definition '{d[0]}' cannot be used.", file=sys.stderr)
-                return False
-        print(f"* User definitions: {project['def']}")
+                log(f"* User definition '{d[0]}' cannot be used.", prefix, sys.stderr)
+                return -1
+        log(f"* User definitions: {project['def']}", prefix)
         definitions = project['def'] + ' '
     else:
         definitions = ''
@@ -199,11 +426,16 @@ def build(config, board=None, interface=None):
     if interface is not None and interface.upper() == 'LAST':
         interface = last_build_context.get('interface')
     
-    print(f"* Flash interface: {interface}")
+    log(f"* Flash interface: {interface}", prefix)
 
-    env = os.environ
+    # The index only guesses the interfaces from the makefiles without their conditionals and includes, so make has the final say.
+    interfaces = (board_index.get_board(repo_dir, board) or {}).get('interfaces', [])
+    if interface is not None and len(interfaces) > 0 and interface.split(':')[0] not in interfaces:
+        log(f"* The flash interface '{interface}' is not found among the interfaces of the board '{board}' {interfaces}. Trying it anyway.", prefix, sys.stderr)
+
+    env = dict(os.environ)
     env['PWD'] = os.path.join(repo_dir, 'make')
-    env['BOARD'] = project['board']
+    env['BOARD'] = board
     if interface is not None:
         env['PORT'] = str(interface)
     env['NOLA_CLI'] = VersionInfo('nola_tools').release_string()
@@ -215,14 +447,191 @@ def build(config, board=None, interface=None):
         if paths.get('jlink') is not None:
             env['PATH_JLINK'] = paths.get('jlink')
 
-    ret_code = run_process(command_args, env)
+    blobs = get_blobs(repo_dir, board)
+
+    # The libnola source tree may change without changing its version in development mode.
+    use_cache = interface is None and 'libnola' not in config
+    restored = None
+    if use_cache:
+        with build_profile.phase(profile, 'cache lookup'):
+            cache_key = cache.get_key(board, project, project_version, libnola_version)
+            restored = cache.lookup(cache_key, build_dir)
+
+    if restored is not None:
+        log(f"* Restored from the cache: {restored}", prefix)
+        ret_code = 0
+    else:
+        with build_profile.phase(profile, 'make'):
+            ret_code = run_make(command_args, env, project, config, board, prefix, profile, log_file)
+        if use_cache and ret_code == 0:
+            with build_profile.phase(profile, 'cache store'):
+                cache.store(cache_key, board, get_artifacts(build_dir, blobs),
+                            config.get('cache_size', cache.DEFAULT_SIZE_LIMIT_MB))
 
     last_build_context['ver'] = libnola_version
+    if libnola_fingerprint is not None:
+        last_build_context['libnola'] = libnola_fingerprint
     if interface is not None:
         last_build_context['interface'] = interface
     config_file.save(last_build_context, os.path.join(build_dir, 'build.json'))
+
+    if profile is not None:
+        path = build_profile.save(profile, build_dir)
+        if show_profile:
+            for line in build_profile.format_summary(profile, path):
+                log(line, prefix)
     
-    return ret_code == 0
+    return ret_code
+
+def get_blobs(repo_dir, board):
+    return (board_index.get_board(repo_dir, board) or {}).get('blobs', [])
+
+FICLONE = 0x40049409
+
+def reflink(src, dst):
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+def stage_blob(src, build_dir):
+    """Place a board file into the build directory. Returns the number of bytes not copied."""
+    dst = os.path.join(build_dir, os.path.basename(src))
+    st = os.stat(src)
+    try:
+        st_dst = os.stat(dst)
+        if st_dst.st_size == st.st_size and st_dst.st_mtime_ns == st.st_mtime_ns:
+            return st.st_size
+        os.remove(dst)
+    except FileNotFoundError:
+        pass
+
+    if reflink(src, dst):
+        return st.st_size
+
+    # A hard link shares the file. Link only the copy in the blob store of nola, never the SDK file which may be written through the link.
+    # Hard links do not cross devices, so the file is added to the blob store only if it can be linked from there.
+    try:
+        if os.stat(build_dir).st_dev == cache.get_blob_device():
+            os.link(cache.get_blob(src), dst)
+            return st.st_size
+    except OSError:
+        pass
+
+    shutil.copy2(src, dst)
+    return 0
+
+def stage_blobs(repo_dir, board, build_dir):
+    blobs = get_blobs(repo_dir, board)
+    size_avoided = 0
+    for b in blobs:
+        size_avoided += stage_blob(os.path.join(repo_dir, board, b), build_dir)
+    return len(blobs), size_avoided
+
+def get_artifacts(build_dir, blobs=[]):
+    for pattern in ['*.elf', '*.bin', '*.hex']:
+        for f in glob.glob(os.path.join(build_dir, pattern)):
+            if os.path.basename(f) not in blobs:
+                yield f
+
+def check_boards(boards, available_boards):
+    unsupported = [b for b in boards if b not in available_boards]
+    if len(unsupported) > 0:
+        print(f"* The board(s) {unsupported} not supported.", file=sys.stderr)
+        print(f"* Avilable boards: {available_boards}", file=sys.stderr)
+        return False
+    return True
+
+def build_matrix(config, project, boards, force=False, show_profile=False, log_path=None):
+    if config.get('libnola', '').startswith('wsl://'):
+        print("* Building multiple boards is not supported with a WSL libnola source tree.", file=sys.stderr)
+        return False
+
+    repo_dir = get_repo_dir(config, project)
+    if repo_dir is None:
+        return False
+    available_boards = supported_boards(repo_dir)
+    if boards == 'all':
+        boards = available_boards
+    else:
+        boards = [b for b in boards.split(',') if b != '']
+        if 'libnola' not in config:
+            for b in boards:
+                if b not in available_boards and add_sparse_board(repo_dir, b):
+                    available_boards.append(b)
+            if check_boards(boards, available_boards) == False:
+                return False
+    if len(boards) == 0:
+        print("* No board to build.", file=sys.stderr)
+        return False
+
+    jobs, load_limit = get_jobs(project, config)
+    make_parallel_args = get_make_parallel_args(jobs, load_limit)
+    num_workers = max(1, min(len(boards), (os.cpu_count() or 1) // (jobs or 1)))
+    print(f"* Target boards: {boards} ({num_workers} at a time)")
+
+    profiles = {board: build_profile.new(board) for board in boards}
+    with contextlib.ExitStack() as stack:
+        log_files = {}
+        if log_path is not None:
+            root, ext = os.path.splitext(log_path)
+            log_files = {board: stack.enter_context(open(f"{root}-{board}{ext}", 'wb', buffering=0)) for board in boards}
+        libnola_fingerprint = None
+        libnola_changed = {}
+        if 'libnola' in config:
+            # Targets of libnola share its source tree. Build them one by one before the boards.
+            libnola_fingerprint = get_tree_fingerprint(config['libnola'])
+            for board in boards:
+                with build_profile.phase(profiles[board], 'libnola'):
+                    libnola_changed[board] = force or is_libnola_changed(config, board, libnola_fingerprint)
+                    if libnola_changed[board] == False:
+                        log("* libnola is not changed since the last build.", board)
+                    elif build_libnola(config, project, board, make_parallel_args, board, profiles[board], log_files.get(board)) == False:
+                        return False
+            # libnola puts the boards it builds into the repository, so check them afterwards as for a single board.
+            if check_boards(boards, supported_boards(repo_dir)) == False:
+                return False
+
+        shared_profile = build_profile.new(None)
+        with build_profile.phase(shared_profile, 'versions'):
+            project_version, libnola_version = get_build_versions(config, repo_dir)
+        for board in boards:
+            profiles[board]['phases'] += shared_profile['phases']
+
+        def build_one(board):
+            time_start = time.time()
+            try:
+                ret_code = build_board(config, project, board, repo_dir,
+                                       project_version, libnola_version,
+                                       make_parallel_args, prefix=board,
+                                       libnola_fingerprint=libnola_fingerprint,
+                                       clean=libnola_changed.get(board, False),
+                                       profile=profiles[board],
+                                       show_profile=show_profile,
+                                       log_file=log_files.get(board))
+            except Exception as e:
+                log(f"* Build error: {e}", board, sys.stderr)
+                ret_code = -1
+            blobs = get_blobs(repo_dir, board)
+            size = sum(os.path.getsize(f) for f in get_artifacts(os.path.join('build', board), blobs))
+            return board, ret_code, time.time() - time_start, size
+
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            results = list(executor.map(build_one, boards))
+
+        print("* Summary:")
+        width = max(len(b) for b in boards)
+        for board, ret_code, duration, size in results:
+            print(f"  {board:<{width}}  {'PASS' if ret_code == 0 else 'FAIL'}  {duration:8.1f} s  {size:10d} bytes")
+
+        return all(r[1] == 0 for r in results)
 
 def clean():
     if os.path.exists('Nol.A-project.json') == False:
@@ -231,6 +640,6 @@ def clean():
         return False
 
     if os.path.exists('build') == True:
-        shutil.rmtree('build')
+        remove_tree('build')
     
     return True
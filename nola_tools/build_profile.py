@@ -0,0 +1,126 @@
+import sys
+import os
+import re
+import time
+from contextlib import contextmanager
+from .utils import config_file
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+# A compiler, linker or objcopy command line, or a short 'CC foo.o' style line printed by make.
+TARGET_PATTERNS = [re.compile(r'\s-o\s*(\S+)'),
+                   re.compile(r'^\s*(?:CC|CXX|AS|LD|AR|OBJCOPY|GEN)\s+(\S+)')]
+
+def new(board):
+    return {
+        'board': board,
+        'start': time.time(),
+        'phases': [],
+        'processes': [],
+        'targets': []
+    }
+
+def get_children_usage():
+    if resource is None:
+        return 0.0
+    r = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return r.ru_utime + r.ru_stime
+
+def get_processes_usage(profile, first):
+    """Sum the CPU time of the processes of the profile from the index `first`, as waited by wait4."""
+    return sum(p.get('user', 0.0) + p.get('system', 0.0) for p in profile['processes'][first:])
+
+def get_maxrss(ru):
+    # Bytes on macOS, but kilobytes on Linux.
+    return ru.ru_maxrss if sys.platform == 'darwin' else ru.ru_maxrss * 1024
+
+@contextmanager
+def phase(profile, name):
+    """Record the wall time, CPU time of this process and its children of the phase."""
+    if profile is None:
+        yield
+        return
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    children = get_children_usage()
+    processes = len(profile['processes'])
+    try:
+        yield
+    finally:
+        # RUSAGE_CHILDREN is process-wide and includes the compilers of the other boards of a matrix build.
+        # The usage of the processes run for this profile is summed instead where wait4 reports it.
+        if hasattr(os, 'wait4'):
+            children_cpu = get_processes_usage(profile, processes)
+        else:
+            children_cpu = get_children_usage() - children
+        profile['phases'].append({
+            'name': name,
+            'wall': time.perf_counter() - wall,
+            'cpu': time.process_time() - cpu,
+            'children_cpu': children_cpu
+        })
+
+def add_line(profile, line):
+    """Timestamp a target built by the make output line."""
+    if profile is None:
+        return
+    for pattern in TARGET_PATTERNS:
+        m = pattern.search(line)
+        if m is not None:
+            profile['targets'].append({
+                'target': m.group(1),
+                'time': time.time() - profile['start']
+            })
+            return
+
+def add_process(profile, command, wall, ru):
+    if profile is None:
+        return
+    p = {
+        'command': ' '.join(command[:3]),
+        'wall': wall
+    }
+    if ru is not None:
+        p['user'] = ru.ru_utime
+        p['system'] = ru.ru_stime
+        p['peak_rss'] = get_maxrss(ru)
+    profile['processes'].append(p)
+
+def get_target_durations(profile):
+    """Approximate how long each target took by the time until the next target began."""
+    targets = profile['targets']
+    end = profile.get('end', time.time() - profile['start'])
+    durations = []
+    for i, t in enumerate(targets):
+        next_time = targets[i + 1]['time'] if i + 1 < len(targets) else end
+        durations.append((t['target'], next_time - t['time']))
+    return durations
+
+def save(profile, build_dir):
+    profile['end'] = time.time() - profile['start']
+    profile['slowest_targets'] = [{'target': t, 'duration': d} for t, d in sorted(get_target_durations(profile), key=lambda x: -x[1])[:10]]
+    path = os.path.join(build_dir, 'build-profile.json')
+    config_file.save(profile, path, indent=4)
+    return path
+
+def format_summary(profile, path):
+    lines = [f"* Build profile of '{profile['board']}' ({path}):",
+             f"  {'Phase':<20} {'Wall (s)':>10} {'CPU (s)':>10} {'Children CPU (s)':>18}"]
+    for p in profile['phases']:
+        lines.append(f"  {p['name']:<20} {p['wall']:>10.2f} {p['cpu']:>10.2f} {p['children_cpu']:>18.2f}")
+    lines.append(f"  {'Total':<20} {profile['end']:>10.2f}")
+
+    for p in profile['processes']:
+        if 'peak_rss' in p:
+            lines.append(f"  '{p['command']} ...': {p['wall']:.2f} s, user {p['user']:.2f} s, system {p['system']:.2f} s, peak RSS {p['peak_rss'] / 1024 / 1024:.1f} MB")
+
+    if len(profile['slowest_targets']) > 0:
+        lines.append("  Slowest targets:")
+        for t in profile['slowest_targets'][:5]:
+            lines.append(f"    {t['duration']:>8.2f} s  {t['target']}")
+    return lines
@@ -0,0 +1,182 @@
+import os
+import shutil
+import hashlib
+import stat
+import time
+from .utils import config_file
+from .repo import remove_tree
+
+cache_dir = os.path.join(os.path.expanduser('~'), '.nola', 'cache')
+index_json = os.path.join(cache_dir, 'index.json')
+# Read-only copies of the board files by their SHA-256. Only they are hard-linked into build directories, since nothing else writes them.
+blob_dir = os.path.join(cache_dir, 'blobs')
+
+DEFAULT_SIZE_LIMIT_MB = 1024
+
+# Compilers of the toolchains of the boards. An upgrade of any of them changes the cache keys.
+COMPILERS = ['cc', 'c++', 'gcc', 'g++',
+             'arm-none-eabi-gcc', 'arm-none-eabi-g++',
+             'riscv-none-elf-gcc', 'riscv-none-elf-g++',
+             'riscv64-unknown-elf-gcc', 'riscv64-unknown-elf-g++']
+
+def hash_file(path, h):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            h.update(chunk)
+
+def blob_path(digest):
+    return os.path.join(blob_dir, digest[:2], digest)
+
+def get_blob_device():
+    """Return the device of the blob store. Hard links to the blobs work only on it."""
+    os.makedirs(blob_dir, exist_ok=True)
+    return os.stat(blob_dir).st_dev
+
+def get_blob(path):
+    """Return the copy of the file in the blob store, adding it if it is not there yet."""
+    h = hashlib.sha256()
+    hash_file(path, h)
+    digest = h.hexdigest()
+    blob = blob_path(digest)
+
+    # The blobs are counted in the size of the cache and evicted with the entries.
+    with config_file.lock(index_json):
+        index = config_file.load(index_json)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            tmp = f"{blob}.{os.getpid()}.tmp"
+            shutil.copy2(path, tmp)
+            os.chmod(tmp, stat.S_IMODE(os.stat(tmp).st_mode) & ~0o222)
+            os.replace(tmp, blob)
+        index.setdefault('blobs', {})[digest] = {
+            'size': os.path.getsize(blob),
+            'last_used': time.time()
+        }
+        config_file.save(index, index_json)
+    return blob
+
+def get_source_files(source_dir):
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.') and not (root == source_dir and d == 'build'))
+        for f in sorted(files):
+            if f.startswith('.') or (root == source_dir and f == 'Nol.A-project.json'):
+                continue
+            yield os.path.join(root, f)
+
+def get_toolchain_identity():
+    identity = []
+    for tool in ['make'] + COMPILERS:
+        path = shutil.which(tool)
+        if path is None:
+            identity.append(f"{tool}:none")
+        else:
+            st = os.stat(path)
+            identity.append(f"{tool}:{os.path.realpath(path)}:{st.st_size}:{st.st_mtime_ns}")
+    return ' '.join(identity)
+
+def get_key(board, project, project_version, libnola_version, source_dir='.'):
+    h = hashlib.sha256()
+    for item in [libnola_version['describe'],
+                 board,
+                 project.get('options', ''),
+                 project.get('def', ''),
+                 project_version['describe'] if project_version is not None else '',
+                 get_toolchain_identity()]:
+        h.update(item.encode('utf-8'))
+        h.update(b'\0')
+
+    for f in get_source_files(source_dir):
+        h.update(os.path.relpath(f, source_dir).encode('utf-8'))
+        h.update(b'\0')
+        hash_file(f, h)
+    return h.hexdigest()
+
+def entry_dir(key):
+    return os.path.join(cache_dir, key[:2], key)
+
+def lookup(key, build_dir):
+    """Restore the artifacts cached by `key` into `build_dir`. Returns the restored file names or None on a miss."""
+    # Boards of a matrix build and other builds share the index.
+    with config_file.lock(index_json):
+        index = config_file.load(index_json)
+        entries = index.setdefault('entries', {})
+        entry = entries.get(key)
+        if entry is not None and not os.path.isdir(entry_dir(key)):
+            del entries[key]
+            entry = None
+
+        if entry is None:
+            index['misses'] = index.get('misses', 0) + 1
+            config_file.save(index, index_json)
+            return None
+
+        os.makedirs(build_dir, exist_ok=True)
+        for f in entry['files']:
+            shutil.copy2(os.path.join(entry_dir(key), f), build_dir)
+        entry['last_used'] = time.time()
+        index['hits'] = index.get('hits', 0) + 1
+        config_file.save(index, index_json)
+        return entry['files']
+
+def store(key, board, files, size_limit_mb=DEFAULT_SIZE_LIMIT_MB):
+    files = list(files)
+    if len(files) == 0:
+        return
+
+    with config_file.lock(index_json):
+        index = config_file.load(index_json)
+        entries = index.setdefault('entries', {})
+
+        d = entry_dir(key)
+        if os.path.exists(d):
+            shutil.rmtree(d)
+        os.makedirs(d)
+        for f in files:
+            shutil.copy2(f, d)
+
+        entries[key] = {
+            'board': board,
+            'files': [os.path.basename(f) for f in files],
+            'size': sum(os.path.getsize(f) for f in files),
+            'last_used': time.time()
+        }
+        evict(index, size_limit_mb * 1024 * 1024)
+        config_file.save(index, index_json)
+
+def evict(index, size_limit):
+    entries = index.get('entries', {})
+    blobs = index.get('blobs', {})
+    items = [(entries, key) for key in entries] + [(blobs, digest) for digest in blobs]
+    total = sum(table[key]['size'] for table, key in items)
+    for table, key in sorted(items, key=lambda i: i[0][i[1]]['last_used']):
+        if total <= size_limit:
+            break
+        total -= table[key]['size']
+        if table is entries:
+            shutil.rmtree(entry_dir(key), ignore_errors=True)
+        else:
+            # Build directories keep their links to the blob.
+            try:
+                os.remove(blob_path(key))
+            except FileNotFoundError:
+                pass
+        del table[key]
+
+def report():
+    index = config_file.load(index_json)
+    entries = index.get('entries', {})
+    blobs = index.get('blobs', {})
+    hits = index.get('hits', 0)
+    misses = index.get('misses', 0)
+    total = hits + misses
+    print(f"* Cache directory: {cache_dir}")
+    print(f"* Entries: {len(entries)} ({sum(e['size'] for e in entries.values())} bytes)")
+    print(f"* Blobs: {len(blobs)} ({sum(b['size'] for b in blobs.values())} bytes)")
+    print(f"* Hits: {hits}, Misses: {misses}, Hit rate: {(hits / total * 100) if total > 0 else 0:.1f}%")
+    return True
+
+def clear():
+    if os.path.isdir(cache_dir):
+        remove_tree(cache_dir)
+    print("* Cache cleared.")
+    return True
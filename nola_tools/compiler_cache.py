@@ -0,0 +1,70 @@
+import os
+import shutil
+import hashlib
+import subprocess
+from .cache import get_toolchain_identity, COMPILERS
+
+ccache_dir = os.path.join(os.path.expanduser('~'), '.nola', 'ccache')
+launcher_dir = os.path.join(ccache_dir, 'bin')
+
+# The compilers in COMPILERS are masqueraded by ccache if they are found in PATH.
+
+def is_enabled(project, config):
+    enabled = project.get('ccache', config.get('ccache', True))
+    return enabled != False and shutil.which('ccache') is not None
+
+def setup_launchers():
+    """Make symbolic links named after the compilers to ccache, so that make runs the compilers through it."""
+    ccache = os.path.realpath(shutil.which('ccache'))
+    os.makedirs(launcher_dir, exist_ok=True)
+    for compiler in COMPILERS:
+        link = os.path.join(launcher_dir, compiler)
+        if shutil.which(compiler) is None:
+            if os.path.islink(link):
+                os.remove(link)
+            continue
+        if os.path.islink(link) and os.readlink(link) == ccache:
+            continue
+        try:
+            if os.path.lexists(link):
+                os.remove(link)
+            os.symlink(ccache, link)
+        except FileExistsError:
+            # Made by another build at the same time.
+            pass
+        except OSError:
+            return False
+    return True
+
+def setup_env(env, board):
+    """Inject ccache into `env` with a cache directory per toolchain and board. Returns False if it is not possible."""
+    if setup_launchers() == False:
+        return False
+
+    toolchain = hashlib.sha256(get_toolchain_identity().encode('utf-8')).hexdigest()[:12]
+    env['PATH'] = launcher_dir + os.pathsep + env.get('PATH', '')
+    env['CCACHE_DIR'] = os.path.join(ccache_dir, toolchain, board)
+    env['CCACHE_BASEDIR'] = os.getcwd()
+    os.makedirs(env['CCACHE_DIR'], exist_ok=True)
+    return True
+
+def zero_stats(env):
+    subprocess.run(['ccache', '--zero-stats'], env=env, capture_output=True)
+
+def get_stats(env):
+    try:
+        p = subprocess.run(['ccache', '--print-stats'], env=env, capture_output=True)
+    except OSError:
+        return None
+    if p.returncode != 0:
+        return None
+
+    stats = {}
+    for line in p.stdout.decode(errors='replace').splitlines():
+        fields = line.split('\t')
+        if len(fields) == 2 and fields[1].isdigit():
+            stats[fields[0]] = int(fields[1])
+
+    hits = stats.get('direct_cache_hit', 0) + stats.get('preprocessed_cache_hit', 0)
+    misses = stats.get('cache_miss', 0)
+    return hits, misses
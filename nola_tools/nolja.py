@@ -9,6 +9,10 @@ import base64
 import time
 import math
 import hashlib
+from .utils import compress
+
+# The bit of the compressed blocks (0x11) in the capabilities reported by the bootloader.
+BOOTLOADER_CAPABILITY_COMPRESSED = 0x01
 
 def receiveMessage():
     if format != 'bootloader':
@@ -121,6 +125,20 @@ def sendGetEui64():
         except:
             return None
         
+def sendGetCompression():
+    """Return whether the target reports the support of compressed blocks. Targets not answering the query support none."""
+    if format == 'bootloader':
+        msg = bytearray(b'\x1d')
+        resp = sendMessage(msg, 1)
+        return resp is not None and len(resp) >= 2 and resp[0] == 0x3A and (resp[1] & BOOTLOADER_CAPABILITY_COMPRESSED) != 0
+    elif format == 'json':
+        msg = 'get capabilities\r\n'
+        resp = sendMessage(msg, 1)
+        if resp is None or resp.get('result') != 'OK' or type(resp.get('capabilities')) is not list:
+            return False
+        return 'savefilelz' in resp.get('capabilities')
+    return False
+
 def sendMassErase(name=None):
     if format == 'bootloader':
         msg = bytearray(b'\x15')
@@ -169,6 +187,42 @@ def sendDataBlock(addr, data, name=None):
         return True
     return False
 
+def sendCompressedBlock(addr, size, data, name=None):
+    """Send a block of utils.compress which is `size` bytes decompressed."""
+    if format == 'bootloader':
+        msg = bytearray(b'\x11')
+        msg.append((addr >> 0) & 0xFF)
+        msg.append((addr >> 8) & 0xFF)
+        msg.append((addr >> 16) & 0xFF)
+        msg.append((size >> 0) & 0xFF)
+        msg.append((size >> 8) & 0xFF)
+        msg += data
+        resp = sendMessage(msg, 1)
+        if resp == b'\x3B\x00':
+            return True
+        else:
+            return False
+    elif format == 'json':
+        if name is None:
+            return False
+        data_encoded = base64.b64encode(data).decode('ascii')
+        msg = f"savefilelz fw/{name} {addr} {size} {data_encoded}\r\n"
+        resp = sendMessage(msg, 5)
+        if resp is None:
+            print(f"\n  Sending compressed data block failed (no response)", file=sys.stderr)
+            return False
+        elif resp.get('command') != msg[:-2]:
+            print(f"\n  Sending compressed data block failed (data mismatch)", file=sys.stderr)
+            return False
+        elif resp.get('result') != 'OK':
+            raise Exception(f"Sending compressed data block failed ({resp.get('result')})")
+        return True
+    return False
+
+def getWireSize(size):
+    """The bytes on the serial line for `size` bytes of data."""
+    return size if format == 'bootloader' else 4 * math.ceil(size / 3)
+
 def sendCRCCheck(addr, length):
     msg = bytearray(b'\x16')
     msg.append((addr >> 0) & 0xFF)
@@ -231,6 +285,7 @@ def main():
     parser.add_argument('serial', nargs='?', help='A serial port connected with the board to be flashed (e.g., /dev/ttyUSB0, COM3, ...)')
     parser.add_argument('--flash', type=argparse.FileType('rb'), nargs=1, help='A binary file to flash (e.g., output.bin, ./build/test.bin, C:\Temp\hello.bin)', metavar='file')
     parser.add_argument('--region', nargs=1, help='A region name where the file is flashed on (e.g., main, bootloader, model, ...)', metavar='region')
+    parser.add_argument('--compress', action='store_true', help='Send blocks compressed if the target reports the support of them')
     parser.add_argument('--eui', nargs=1, help='Set the new EUI-64. The EUI-64 must be a 64-bit hexadecimal string. (e.g., 0011223344556677)', metavar='EUI-64')
     args = parser.parse_args()
 
@@ -315,6 +370,16 @@ def main():
         addr = 0
         printed = 0
 
+        compression = False
+        if args.compress:
+            compression = sendGetCompression()
+            if not compression:
+                print("* Compressed blocks are not supported by the target. Sending them uncompressed.")
+        compressed_size = 0
+        wire_size = 0
+        raw_wire_size = 0
+        total_wire_size = 0
+
         time_start = time.time()
 
         while addr < len(image):
@@ -328,7 +393,26 @@ def main():
             except:
                 printed = 0
 
-            if sendDataBlock(addr, block, name) == False:
+            compressed = None
+            if compression:
+                compressed, size = compress.compress(image[addr:addr + compress.MAX_BLOCK_SIZE], blocksize - 2)
+                if size < len(block) or (size == len(block) and len(compressed) + 2 >= len(block)):
+                    compressed = None
+
+            if compressed is not None:
+                result = sendCompressedBlock(addr, size, compressed, name)
+                if result == True:
+                    block = image[addr : addr + size]
+                    compressed_size += size
+                    wire_size += getWireSize(len(compressed) + 2)
+                    raw_wire_size += getWireSize(size)
+                    total_wire_size += getWireSize(len(compressed) + 2)
+            else:
+                result = sendDataBlock(addr, block, name)
+                if result == True:
+                    total_wire_size += getWireSize(len(block))
+
+            if result == False:
                 if format == 'json':
                     num_fail += 1
                     num_continuous_success = 0
@@ -353,6 +437,9 @@ def main():
                 printed -= 1
 
         print(f'\n  Flashing done ({time_now - time_start} seconds)')
+        if compressed_size > 0:
+            saved = raw_wire_size - wire_size
+            print(f'  Compressed: {compressed_size} bytes in {wire_size} bytes on the wire instead of {raw_wire_size} bytes ({saved} bytes and about {saved * (time.time() - time_start) / total_wire_size:.1f} seconds saved)')
 
         if format == 'bootloader':
             devCrc = sendCRCCheck(0, len(image))
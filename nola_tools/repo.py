@@ -2,36 +2,180 @@ import sys
 import os
 import shutil
 import git
+import hashlib
+import stat
 from functools import cmp_to_key
+from .utils import config_file
 
 homedir = os.path.join(os.path.expanduser('~'), '.nola')
 env = {
     "GIT_SSH_COMMAND": f"ssh -i {os.path.join(homedir, 'key')} -o IdentitiesOnly=yes -o StrictHostKeyChecking=no"
 }
+versions_json = os.path.join(homedir, 'versions.json')
+sdk_dir = os.path.join(homedir, 'sdk')
 
-def clone(repo_dir, user):
+# Directories always checked out in the sparse checkout besides the boards.
+SPARSE_COMMON_DIRS = ['include', 'make', 'tools']
+
+def remove_tree(path):
+    """shutil.rmtree() which removes read-only files too, such as the SDK worktrees and the files staged from them on Windows."""
+    def remove_read_only(func, path, _):
+        os.chmod(path, stat.S_IWRITE)
+        func(path)
+
+    if sys.version_info >= (3, 12):
+        shutil.rmtree(path, onexc=remove_read_only)
+    else:
+        shutil.rmtree(path, onerror=remove_read_only)
+
+def clone(repo_dir, user, depth=None, filter=None, sparse_boards=None):
+    """Clone the SDK repository.
+
+    `depth` makes a shallow clone, `filter` (e.g., 'blob:none') makes a partial clone, and `sparse_boards` checks out only the common directories and the boards."""
     if os.path.exists(repo_dir):
-        shutil.rmtree(repo_dir)
+        remove_tree(repo_dir)
+
+    options = {}
+    if depth is not None:
+        options['depth'] = depth
+    if filter is not None:
+        options['filter'] = filter
+    if sparse_boards is not None:
+        options['sparse'] = True
 
     try:
         if user is None:
             repo = git.Repo.clone_from("https://git.coxlab.kr/nola/libnola.git",
-                                       repo_dir)
+                                       repo_dir,
+                                       **options)
         else:
             repo = git.Repo.clone_from(f"ssh://git@git.coxlab.kr:40022/nola/libnola-{user}.git",
                                        repo_dir,
-                                       env=env)
+                                       env=env,
+                                       **options)
+        if sparse_boards is not None:
+            repo.git.sparse_checkout('set', *(SPARSE_COMMON_DIRS + list(sparse_boards)), env=env)
         return True
     except git.exc.GitCommandError:
         print(f"* Cloning repositry error", file=sys.stderr)
         return False
 
+def is_shallow(repo_dir):
+    return os.path.exists(os.path.join(get_git_dir(repo_dir), 'shallow'))
+
+def is_sparse(repo_dir):
+    return os.path.exists(os.path.join(get_git_dir(repo_dir), 'info', 'sparse-checkout'))
+
+def add_sparse_board(repo_dir, board):
+    """Add the board to the sparse checkout. Returns False if the repository is not sparse or the board is not found."""
+    if not is_sparse(repo_dir):
+        return False
+    try:
+        g = git.cmd.Git(repo_dir)
+        if board not in g.ls_tree('--name-only', 'HEAD').split('\n'):
+            return False
+        print(f"* Adding the board '{board}' to the sparse checkout...")
+        # The files of the board are fetched in a partial clone.
+        g.sparse_checkout('add', board, env=env)
+        return True
+    except git.exc.GitCommandError:
+        return False
+
+def get_remote_tags(repo_dir):
+    try:
+        refs = git.cmd.Git(repo_dir).ls_remote('--tags', '--refs', 'origin', env=env)
+    except git.exc.GitCommandError:
+        return []
+    return [line.split('refs/tags/', 1)[1] for line in refs.splitlines() if 'refs/tags/' in line]
+
+def fetch_tag(repo_dir, version):
+    """Fetch a tag (and its objects) missing in a shallow clone."""
+    options = {'depth': 1} if is_shallow(repo_dir) else {}
+    print(f"* Fetching the version '{version}'...")
+    try:
+        git.cmd.Git(repo_dir).fetch('origin', f"+refs/tags/{version}:refs/tags/{version}", env=env, **options)
+        return True
+    except git.exc.GitCommandError:
+        return False
+
+def index_boards(repo_dir):
+    """Index the boards of the version checked out, so that builds do not scan the SDK tree."""
+    from .board_index import get_boards
+    print(f"* {len(get_boards(repo_dir))} boards indexed")
+
 def get_versions(repo_dir):
-    return get_current_version(repo_dir), get_available_versions(repo_dir)
+    return get_current_version(repo_dir, use_cache=True), get_available_versions(repo_dir)
+
+def get_git_dir(repo_dir):
+    git_dir = os.path.join(repo_dir, '.git')
+    if os.path.isfile(git_dir):
+        # A worktree has a file pointing to its git directory.
+        with open(git_dir) as f:
+            line = f.read().strip()
+        if line.startswith('gitdir:'):
+            git_dir = os.path.join(repo_dir, line[7:].strip())
+    return git_dir
+
+def get_refs_key(repo_dir):
+    """A cache key which changes when HEAD, a tag, or the index of the repository changes. None if unavailable."""
+    git_dir = get_git_dir(repo_dir)
+    try:
+        with open(os.path.join(git_dir, 'HEAD')) as f:
+            head = f.read().strip()
+    except OSError:
+        return None
+
+    key = [head]
+    if head.startswith('ref:'):
+        try:
+            with open(os.path.join(git_dir, head[4:].strip())) as f:
+                key.append(f.read().strip())
+        except OSError:
+            # The ref is packed.
+            pass
 
-def get_current_version(repo_dir):
+    common_dir = git_dir
+    if os.path.isfile(os.path.join(git_dir, 'commondir')):
+        with open(os.path.join(git_dir, 'commondir')) as f:
+            common_dir = os.path.join(git_dir, f.read().strip())
+
+    for path in [os.path.join(common_dir, 'packed-refs'),
+                 os.path.join(common_dir, 'refs', 'tags'),
+                 os.path.join(git_dir, 'index')]:
+        try:
+            key.append(str(os.stat(path).st_mtime_ns))
+        except OSError:
+            key.append('-')
+    return ' '.join(key)
+
+def get_cached(repo_dir, name, get):
+    """Return the cached `name` of `repo_dir` if the refs are not changed since it was got, or call `get` and cache it."""
+    key = get_refs_key(repo_dir)
+    if key is None:
+        return get()
+
+    cached = config_file.load(versions_json).get(os.path.abspath(repo_dir), {}).get(name)
+    if cached is not None and cached.get('key') == key:
+        return cached['value']
+
+    value = get()
+    # 'git describe' may refresh the index.
+    key = get_refs_key(repo_dir)
+    with config_file.lock(versions_json):
+        versions = config_file.load(versions_json)
+        versions.setdefault(os.path.abspath(repo_dir), {})[name] = {
+            'key': key,
+            'value': value
+        }
+        config_file.save(versions, versions_json)
+    return value
+
+def get_current_version(repo_dir, use_cache=False):
     assert os.path.exists(repo_dir), "'login' is required."
 
+    if use_cache:
+        return get_cached(repo_dir, 'current', lambda: get_current_version(repo_dir))
+
     try:
         v = git.cmd.Git(repo_dir).describe('--tags', '--always', '--dirty', '--abbrev=7', '--long')
     except git.exc.GitCommandError as e:
@@ -63,16 +207,48 @@ def get_current_version(repo_dir):
         
     return vparsed
 
-def get_available_versions(repo_dir):
-    assert os.path.exists(repo_dir), "'login' is required."
+def get_tree_fingerprint(src_dir, exclude=['nola-sdk']):
+    """Fingerprint a source tree by its git HEAD and the modification times of changed files.
 
+    Ignored files (e.g., build outputs) are not taken into account. If the tree is not a git working tree, the modification times of all files are used."""
+    h = hashlib.sha256()
     try:
-        versions = git.Repo(repo_dir).tags
-    except git.exc.GitCommandError as e:
-        return []
-    
-    version_names = [v.name for v in versions]
+        g = git.cmd.Git(src_dir)
+        h.update(g.rev_parse('HEAD').encode('utf-8'))
+        paths = []
+        for line in g.status('--porcelain', '--untracked-files=all').splitlines():
+            path = line[3:].split(' -> ')[-1].strip('"')
+            if path.split('/')[0] not in exclude:
+                paths.append(path)
+    except git.exc.GitError:
+        paths = []
+        for root, dirs, files in os.walk(src_dir):
+            dirs[:] = [d for d in dirs if not d.startswith('.') and not (root == src_dir and d in exclude)]
+            paths += [os.path.relpath(os.path.join(root, f), src_dir) for f in files]
+
+    for path in sorted(paths):
+        try:
+            st = os.stat(os.path.join(src_dir, path))
+            h.update(f"{path}:{st.st_size}:{st.st_mtime_ns}\n".encode('utf-8'))
+        except OSError:
+            h.update(f"{path}:deleted\n".encode('utf-8'))
+    return h.hexdigest()
+
+def get_tags(repo_dir):
+    assert os.path.exists(repo_dir), "'login' is required."
+
+    def list_tags():
+        try:
+            return git.cmd.Git(repo_dir).tag('--list').split()
+        except git.exc.GitCommandError as e:
+            return []
+
+    return get_cached(repo_dir, 'tags', list_tags)
+
+def get_available_versions(repo_dir):
+    return sort_versions(get_tags(repo_dir))
 
+def sort_versions(version_names):
     def is_valid(v_str):
         parts = v_str.lstrip('v').split('.')
         try:
@@ -109,32 +285,100 @@ def cmp_version(A, B):
     else:
         return 1 if a[0] > b[0] else -1
 
+def reset_to_tag(repo_dir, version):
+    """Check out the tag of the version. The missing files are fetched in a partial clone."""
+    repo = git.Repo(repo_dir)
+    repo.git.update_environment(**env)
+    try:
+        repo.head.reset(f"refs/tags/{version}", working_tree=True)
+    except git.exc.GitCommandError as e:
+        print(f"* Checking out the version '{version}' failed: {e}", file=sys.stderr)
+        return False
+    index_boards(repo_dir)
+    return True
+
 def checkout(repo_dir, version=None):
     assert os.path.exists(repo_dir), "'login' is required."
 
-    repo = git.Repo(repo_dir)
-
     if version is not None:
-        if version in [v.name for v in repo.tags]:
+        if version not in get_tags(repo_dir) and is_shallow(repo_dir) and version in get_remote_tags(repo_dir):
+            fetch_tag(repo_dir, version)
+
+        if version in get_tags(repo_dir):
             print(f"* Checking out the version '{version}'...")
-            repo.head.reset(f"refs/tags/{version}", working_tree=True)
-            return True
+            return reset_to_tag(repo_dir, version)
         else:
             print(f"* The version '{version}' is not found.", file=sys.stderr)
             print(f"* Avilable versions: {get_available_versions(repo_dir)}")
             return False
-    latest = get_available_versions(repo_dir)[0]
+    if is_shallow(repo_dir):
+        # Tags of the history not fetched yet are not known locally.
+        latest = sort_versions(set(get_remote_tags(repo_dir) + get_tags(repo_dir)))[0]
+        if latest not in get_tags(repo_dir) and fetch_tag(repo_dir, latest) == False:
+            print(f"* Fetching the version '{latest}' failed.", file=sys.stderr)
+            return False
+    else:
+        latest = get_available_versions(repo_dir)[0]
 
     print(f"* Checking out the latest version '{latest}'")
-    repo.head.reset(f"refs/tags/{latest}", working_tree=True)
-    return True
+    return reset_to_tag(repo_dir, latest)
     
+def get_worktree(repo_dir, version):
+    """Return the read-only worktree of the SDK version under ~/.nola/sdk, adding it if it does not exist yet.
+
+    Returns None if the version is not found."""
+    assert os.path.exists(repo_dir), "'login' is required."
+
+    worktree = os.path.join(sdk_dir, version)
+    if os.path.exists(os.path.join(worktree, '.git')):
+        return worktree
+
+    if version not in get_tags(repo_dir):
+        if not is_shallow(repo_dir) or version not in get_remote_tags(repo_dir) or fetch_tag(repo_dir, version) == False:
+            return None
+
+    print(f"* Adding the SDK version '{version}' to {worktree}...")
+    os.makedirs(sdk_dir, exist_ok=True)
+    g = git.cmd.Git(repo_dir)
+    try:
+        g.worktree('prune')
+        g.worktree('add', '--detach', worktree, f"refs/tags/{version}", env=env)
+    except git.exc.GitCommandError as e:
+        if os.path.exists(os.path.join(worktree, '.git')):
+            # Added by another nola at the same time.
+            return worktree
+        print(f"* Adding the worktree failed: {e}", file=sys.stderr)
+        return None
+
+    # Builds only read the SDK. Keep them from modifying the tree shared among projects.
+    for root, dirs, files in os.walk(worktree):
+        if '.git' in dirs:
+            dirs.remove('.git')
+        for f in files:
+            path = os.path.join(root, f)
+            if not os.path.islink(path):
+                os.chmod(path, os.stat(path).st_mode & ~0o222)
+    index_boards(worktree)
+    return worktree
+
 def update(repo_dir):
     assert os.path.exists(repo_dir), "'login' is required."
 
     repo = git.Repo(repo_dir)
-    existing_versions = [t.name for t in repo.tags]
-    
+    existing_versions = get_tags(repo_dir)
+
+    if is_shallow(repo_dir):
+        # Keep the clone shallow. Tags are fetched on demand by 'checkout'.
+        git.Remote(repo, 'origin').fetch(env=env, depth=1)
+        new_versions = [v for v in sort_versions(get_remote_tags(repo_dir)) if v not in existing_versions]
+        if len(new_versions) > 0:
+            print(f"* New version(s) avilable: {new_versions}")
+            print(f"* Change the version by 'checkout' command")
+        else:
+            print("* Up to date")
+        index_boards(repo_dir)
+        return True
+
     result = git.Remote(repo, 'origin').fetch(env=env)
     if result[0].flags & git.remote.FetchInfo.ERROR != 0:
         print("* ERROR on update")
@@ -154,5 +398,6 @@ def update(repo_dir):
 
     if result[0].flags & git.remote.FetchInfo.HEAD_UPTODATE:
         print("* Up to date")
-    
+
+    index_boards(repo_dir)
     return True
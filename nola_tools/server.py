@@ -0,0 +1,238 @@
+import sys
+import os
+import json
+import socket
+import signal
+import selectors
+import time
+
+socket_path = os.path.join(os.path.expanduser('~'), '.nola', 'nola.sock')
+
+# Sent by the daemon after the output of a command. Build outputs never contain NUL.
+EXIT_MARKER = b'\0nola-exit:'
+
+DEFAULT_CONCURRENCY = 2
+
+# Seconds to wait for a client to send its request line.
+REQUEST_TIMEOUT = 10
+
+def request(argv):
+    """Run the command by the daemon if it is running. Returns the exit code, or None if no daemon serves it."""
+    if not hasattr(socket, 'AF_UNIX') or os.environ.get('NOLA_NO_DAEMON') is not None or not os.path.exists(socket_path):
+        return None
+
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(socket_path)
+        s.sendall(json.dumps({
+            'argv': argv,
+            'cwd': os.getcwd(),
+            'env': dict(os.environ)
+        }).encode('utf-8') + b'\n')
+    except OSError:
+        s.close()
+        return None
+
+    out = sys.stdout.buffer
+    held = b''
+    with s:
+        for data in iter(lambda: s.recv(65536), b''):
+            if held == b'' and b'\0' not in data:
+                out.write(data)
+                out.flush()
+                continue
+            # Hold from the NUL until the end to find the exit code.
+            pos = data.find(b'\0') if held == b'' else 0
+            out.write(data[:pos])
+            out.flush()
+            held += data[pos:]
+
+    pos = held.rfind(EXIT_MARKER)
+    if pos < 0:
+        out.write(held)
+        print("* The daemon closed the connection unexpectedly.", file=sys.stderr)
+        return 1
+    out.write(held[:pos])
+    out.flush()
+    try:
+        return int(held[pos + len(EXIT_MARKER):].strip())
+    except ValueError:
+        return 1
+
+def run_child(conn, req, inherited):
+    """Run the request in a forked process with its output to the connection."""
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    # Other clients wait for their connections to be closed.
+    for f in inherited:
+        if type(f) is int:
+            os.close(f)
+        else:
+            f.close()
+
+    code = 1
+    try:
+        os.chdir(req['cwd'])
+        os.environ.clear()
+        os.environ.update(req['env'])
+        os.environ['NOLA_NO_DAEMON'] = '1'
+        os.dup2(conn.fileno(), 1)
+        os.dup2(conn.fileno(), 2)
+        sys.stdout.reconfigure(line_buffering=True)
+        sys.stderr.reconfigure(line_buffering=True)
+
+        from . import main
+        sys.argv = ['nola'] + req['argv']
+        code = main()
+    except SystemExit as e:
+        code = e.code if type(e.code) is int else 1
+    except BaseException as e:
+        print(f"* Daemon error: {e}", file=sys.stderr)
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code if type(code) is int else 1)
+
+def warm_up():
+    """Import the modules and load the metadata used by the commands before forking them."""
+    from . import build
+    from .repo import get_versions
+    from .utils import config_file
+
+    repo_dir = os.path.join(os.path.expanduser('~'), '.nola', 'repo')
+    config_file.load(os.path.join(os.path.expanduser('~'), '.nola', 'config.json'))
+    if os.path.exists(repo_dir):
+        get_versions(repo_dir)
+        build.supported_boards(repo_dir)
+
+def serve(concurrency=DEFAULT_CONCURRENCY):
+    if not hasattr(socket, 'AF_UNIX') or not hasattr(os, 'fork'):
+        print("* The daemon is not supported on this platform.", file=sys.stderr)
+        return False
+
+    warm_up()
+
+    if os.path.exists(socket_path):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.connect(socket_path)
+            print(f"* Another daemon is serving on {socket_path}.", file=sys.stderr)
+            return False
+        except OSError:
+            os.remove(socket_path)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    listener.listen()
+
+    # SIGCHLD wakes up the selector to start the queued requests.
+    wakeup = os.pipe()
+    os.set_blocking(wakeup[0], False)
+    os.set_blocking(wakeup[1], False)
+    signal.set_wakeup_fd(wakeup[1])
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    sel = selectors.DefaultSelector()
+    sel.register(listener, selectors.EVENT_READ)
+    sel.register(wakeup[0], selectors.EVENT_READ)
+
+    running = {}
+    queue = []
+    # {conn: [data received, time accepted]} of the clients sending their requests.
+    receiving = {}
+
+    def drop(conn, reason):
+        print(f"* Invalid request: {reason}", file=sys.stderr)
+        sel.unregister(conn)
+        del receiving[conn]
+        conn.close()
+
+    def receive(conn):
+        """Read the request without blocking, so that a slow client never stalls the others."""
+        try:
+            data = conn.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            drop(conn, e)
+            return
+        if data == b'':
+            drop(conn, "closed before the request")
+            return
+        receiving[conn][0] += data
+        if b'\n' not in receiving[conn][0]:
+            return
+
+        line = receiving[conn][0].split(b'\n', 1)[0]
+        try:
+            req = json.loads(line)
+        except ValueError as e:
+            drop(conn, e)
+            return
+        sel.unregister(conn)
+        del receiving[conn]
+        conn.setblocking(True)
+        queue.append((conn, req))
+        if len(running) >= concurrency:
+            try:
+                conn.sendall(f"* Queued ({len(queue)} waiting)\n".encode('utf-8'))
+            except OSError:
+                pass
+
+    def start(conn, req):
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            run_child(conn, req, [sel, listener, *wakeup, *running.values(), *[q[0] for q in queue], *receiving])
+        running[pid] = conn
+        print(f"* [{pid}] nola {' '.join(req['argv'])} in {req['cwd']}")
+
+    print(f"* Serving on {socket_path} (up to {concurrency} at a time)")
+    try:
+        while True:
+            for key, _ in sel.select(1 if len(receiving) > 0 else None):
+                if key.fileobj is listener:
+                    conn, _ = listener.accept()
+                    conn.setblocking(False)
+                    receiving[conn] = [b'', time.monotonic()]
+                    sel.register(conn, selectors.EVENT_READ)
+                elif key.fileobj in receiving:
+                    receive(key.fileobj)
+                else:
+                    try:
+                        os.read(wakeup[0], 4096)
+                    except BlockingIOError:
+                        pass
+
+            for conn in [c for c, r in receiving.items() if time.monotonic() - r[1] > REQUEST_TIMEOUT]:
+                drop(conn, "timed out")
+
+            while len(running) > 0:
+                try:
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+                except ChildProcessError:
+                    break
+                if pid == 0:
+                    break
+                conn = running.pop(pid)
+                code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+                print(f"* [{pid}] exited ({code})")
+                try:
+                    conn.sendall(EXIT_MARKER + str(code).encode('utf-8') + b'\n')
+                except OSError:
+                    pass
+                conn.close()
+
+            while len(queue) > 0 and len(running) < concurrency:
+                start(*queue.pop(0))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+    return True
@@ -0,0 +1,102 @@
+"""A byte-oriented LZ77 codec small enough for bootloaders to decode blocks of firmware images.
+
+A compressed block is a sequence of tokens:
+
+    0x00-0x7F  Literals. (token + 1) bytes follow, copied as they are.
+    0x80-0xFF  A match of ((token & 0x7F) + 3) bytes followed by a byte of (distance - 1).
+               The bytes are copied one by one from `distance` bytes back in the output of the block,
+               so that a match of distance 1 repeats the last byte (e.g., 0xFF padding).
+
+Each block is decoded by itself with at most the last 256 bytes of its output, so blocks can be lost, sent again and applied in any order.
+"""
+
+MIN_MATCH = 3
+MAX_MATCH = 0x7F + MIN_MATCH
+MAX_LITERALS = 0x80
+MAX_DISTANCE = 256
+
+# Candidates of a match looked up at each position.
+MAX_CANDIDATES = 16
+
+# The largest output of a block.
+MAX_BLOCK_SIZE = 4096
+
+def get_literals_size(count):
+    return count + (count + MAX_LITERALS - 1) // MAX_LITERALS
+
+def append_literals(out, data):
+    for i in range(0, len(data), MAX_LITERALS):
+        literals = data[i:i + MAX_LITERALS]
+        out.append(len(literals) - 1)
+        out += literals
+
+def find_match(data, pos, table):
+    best_length, best_distance = 0, 0
+    limit = min(MAX_MATCH, len(data) - pos)
+    for candidate in reversed(table.get(data[pos:pos + MIN_MATCH], [])[-MAX_CANDIDATES:]):
+        distance = pos - candidate
+        if distance > MAX_DISTANCE:
+            break
+        length = 0
+        while length < limit and data[candidate + length] == data[pos + length]:
+            length += 1
+        if length > best_length:
+            best_length, best_distance = length, distance
+            if length == limit:
+                break
+    return best_length, best_distance
+
+def compress(data, limit=None):
+    """Compress `data` from its beginning until the output would exceed `limit` bytes, or the block reaches MAX_BLOCK_SIZE bytes.
+
+    Returns the compressed block and the number of bytes of `data` in it."""
+    data = bytes(data[:MAX_BLOCK_SIZE])
+    out = bytearray()
+    table = {}
+    literal_start = 0
+    pos = 0
+
+    def fits(size):
+        return limit is None or len(out) + size <= limit
+
+    def index(start, end):
+        for i in range(start, min(end, len(data) - MIN_MATCH + 1)):
+            table.setdefault(data[i:i + MIN_MATCH], []).append(i)
+
+    while pos < len(data):
+        length, distance = find_match(data, pos, table) if pos + MIN_MATCH <= len(data) else (0, 0)
+        if length >= MIN_MATCH:
+            if not fits(get_literals_size(pos - literal_start) + 2):
+                break
+            append_literals(out, data[literal_start:pos])
+            out.append(0x80 | (length - MIN_MATCH))
+            out.append(distance - 1)
+            index(pos, pos + length)
+            pos += length
+            literal_start = pos
+        else:
+            if not fits(get_literals_size(pos + 1 - literal_start)):
+                break
+            index(pos, pos + 1)
+            pos += 1
+
+    append_literals(out, data[literal_start:pos])
+    return bytes(out), pos
+
+def decompress(block):
+    """Decode a block. The reference of the decoders in firmware."""
+    out = bytearray()
+    i = 0
+    while i < len(block):
+        token = block[i]
+        if token < 0x80:
+            out += block[i + 1:i + 2 + token]
+            i += 2 + token
+        else:
+            distance = block[i + 1] + 1
+            if distance > len(out):
+                raise ValueError(f"Invalid distance {distance} at {i}")
+            for _ in range((token & 0x7F) + MIN_MATCH):
+                out.append(out[-distance])
+            i += 2
+    return bytes(out)
@@ -1,14 +1,90 @@
 import os
+import stat
 import json
+import copy
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+
+# {path: (mtime_ns, size, config)} of the files loaded or saved by this process.
+loaded = {}
+loaded_lock = threading.Lock()
+
+# {path: threading.Lock} held by lock(). flock() does not exclude threads on Windows, where it is not available.
+path_locks = {}
+path_locks_lock = threading.Lock()
+
+# The mode of new files as open() makes them. mkstemp() makes them 0600.
+umask = os.umask(0)
+os.umask(umask)
+
+def get_stamp(config_file):
+    try:
+        st = os.stat(config_file)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
 
 def load(config_file):
-    config = {}
-    if os.path.exists(config_file):
-        with open(config_file) as f:
-            config = json.load(f)
-    return config
-
-def save(config, config_file):
-    with open(config_file, 'w', encoding='utf-8') as f:
-        json.dump(config, f)
-        
+    stamp = get_stamp(config_file)
+    if stamp is None:
+        return {}
+
+    path = os.path.abspath(config_file)
+    with loaded_lock:
+        cached = loaded.get(path)
+    if cached is not None and cached[0] == stamp:
+        return copy.deepcopy(cached[1])
+
+    with open(config_file, encoding='utf-8') as f:
+        config = json.load(f)
+    with loaded_lock:
+        loaded[path] = (stamp, config)
+    return copy.deepcopy(config)
+
+def save(config, config_file, indent=None):
+    """Replace the file atomically, so that other processes never read it partially written."""
+    d = os.path.dirname(os.path.abspath(config_file))
+    try:
+        mode = stat.S_IMODE(os.stat(config_file).st_mode)
+    except OSError:
+        mode = 0o666 & ~umask
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(config_file) + '.', dir=d)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode)
+        os.replace(tmp, config_file)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+    stamp = get_stamp(config_file)
+    with loaded_lock:
+        loaded[os.path.abspath(config_file)] = (stamp, copy.deepcopy(config))
+
+@contextmanager
+def lock(config_file):
+    """Hold an advisory lock of the file while loading, modifying, and saving it.
+
+    It is an exclusive lock among the threads of this process, and among processes where flock() is available (i.e., not on Windows)."""
+    path = os.path.abspath(config_file)
+    with path_locks_lock:
+        thread_lock = path_locks.setdefault(path, threading.Lock())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with thread_lock, open(path + '.lock', 'w') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
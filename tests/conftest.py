@@ -0,0 +1,2 @@
+def random_bytes(rng, size):
+    return bytes(rng.randrange(256) for _ in range(size))
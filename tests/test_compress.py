@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from conftest import random_bytes
+from nola_tools.utils import compress
+
+def firmware_like(rng, size):
+    """Code-like data: repeated instruction patterns, random constants and 0xFF padding."""
+    patterns = [random_bytes(rng, rng.randrange(2, 12)) for _ in range(20)]
+    data = bytearray()
+    while len(data) < size:
+        choice = rng.random()
+        if choice < 0.6:
+            data += rng.choice(patterns)
+        elif choice < 0.9:
+            data += random_bytes(rng, rng.randrange(1, 8))
+        else:
+            data += b'\xff' * rng.randrange(1, 300)
+    return bytes(data[:size])
+
+SAMPLES = [
+    b'',
+    b'\x00',
+    b'ab',
+    b'abc' * 100,
+    b'\xff' * 3000,
+    random_bytes(random.Random(1), compress.MAX_LITERALS),
+    random_bytes(random.Random(2), compress.MAX_LITERALS + 1),
+    random_bytes(random.Random(3), 3000),
+    firmware_like(random.Random(4), compress.MAX_BLOCK_SIZE),
+]
+
+@pytest.mark.parametrize('data', SAMPLES)
+def test_round_trip(data):
+    block, size = compress.compress(data)
+    assert size == len(data)
+    assert compress.decompress(block) == data
+
+def test_compressible_data_shrinks():
+    data = firmware_like(random.Random(5), compress.MAX_BLOCK_SIZE)
+    block, size = compress.compress(data)
+    assert size == len(data)
+    assert len(block) < len(data) // 2
+
+def test_block_size_is_bounded():
+    data = b'\xff' * (compress.MAX_BLOCK_SIZE * 3)
+    block, size = compress.compress(data)
+    assert size == compress.MAX_BLOCK_SIZE
+    assert compress.decompress(block) == data[:size]
+
+@pytest.mark.parametrize('data', [random_bytes(random.Random(6), 1000), firmware_like(random.Random(7), 3000), b'\xff' * 1000])
+def test_limit(data):
+    for limit in range(1, 300):
+        block, size = compress.compress(data, limit)
+        assert len(block) <= limit
+        assert compress.decompress(block) == data[:size]
+        if limit >= 2:
+            assert size > 0
+
+def test_image_in_chunks():
+    # Chunks of an image compressed one after another, as the FUOTA tools send them.
+    image = firmware_like(random.Random(8), 20000)
+    out = bytearray()
+    while len(out) < len(image):
+        block, size = compress.compress(image[len(out):], 100)
+        assert len(block) <= 100
+        out += compress.decompress(block)
+    assert out == image
+
+def test_invalid_distance():
+    with pytest.raises(ValueError):
+        compress.decompress(bytes([0x00, 0x41, 0x80, 0x01]))
@@ -0,0 +1,66 @@
+import random
+
+from conftest import random_bytes
+from nola_tools import nalja
+
+def apply_delta(base, new, copies, literals):
+    """Build the image as a device does: the copies from the base image and the literals sent."""
+    image = bytearray(len(new))
+    covered = bytearray(len(new))
+    for offset, source, size in copies:
+        assert size >= nalja.DELTA_MIN_COPY
+        image[offset:offset + size] = base[source:source + size]
+        covered[offset:offset + size] = b'\x01' * size
+    for offset, size in literals:
+        assert covered[offset:offset + size] == bytes(size)
+        image[offset:offset + size] = new[offset:offset + size]
+        covered[offset:offset + size] = b'\x01' * size
+    assert covered == b'\x01' * len(new)
+    return bytes(image)
+
+def check_delta(base, new):
+    copies, literals = nalja.make_delta(base, new)
+    assert apply_delta(base, new, copies, literals) == new
+    return copies, literals
+
+def test_same_image():
+    base = random_bytes(random.Random(1), 4096)
+    copies, literals = check_delta(base, base)
+    assert copies == [(0, 0, len(base))]
+    assert literals == []
+
+def test_unrelated_images():
+    rng = random.Random(2)
+    base = random_bytes(rng, 4096)
+    new = random_bytes(rng, 5000)
+    copies, literals = check_delta(base, new)
+    assert copies == []
+    assert literals == [(0, len(new))]
+
+def test_edited_image():
+    rng = random.Random(3)
+    base = random_bytes(rng, 20000)
+    new = base[:1000] + random_bytes(rng, 300) + base[1000:15000] + base[15200:] + random_bytes(rng, 77)
+    copies, literals = check_delta(base, new)
+    assert sum(size for offset, size in literals) < 1000
+
+def test_unaligned_match():
+    rng = random.Random(4)
+    base = random_bytes(rng, 10000)
+    new = random_bytes(rng, 5) + base[3:9000]
+    copies, literals = check_delta(base, new)
+    assert copies == [(5, 3, 8997)]
+
+def test_repeated_blocks():
+    rng = random.Random(5)
+    block = random_bytes(rng, nalja.DELTA_BLOCK_SIZE)
+    base = block * 64 + random_bytes(rng, 1000)
+    new = random_bytes(rng, 10) + block * 100 + base[-500:]
+    check_delta(base, new)
+
+def test_small_images():
+    rng = random.Random(6)
+    base = random_bytes(rng, 1000)
+    for new in [b'', base[:10], base[:nalja.DELTA_MIN_COPY - 1], base[:nalja.DELTA_MIN_COPY]]:
+        check_delta(base, new)
+    check_delta(b'', base)